@@ -1,23 +1,22 @@
 import os
+import errno
 import sys
 import subprocess
 import argparse
 import concurrent.futures
 import time
+import random
+import shutil
+import threading
 from urllib.parse import urlparse, unquote, urljoin
+from email.utils import parsedate_to_datetime
 import xml.etree.ElementTree as ET
 
 import requests
+from requests.adapters import HTTPAdapter
 import m3u8
 from tqdm import tqdm
 
-# Humanize import with fallback install
-try:
-    from humanize import naturalsize
-except ImportError:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "humanize"])
-    from humanize import naturalsize
-
 AXM_BANNER = r"""
                                  /$$      /$$                
                                 | $$$    /$$$                
@@ -36,6 +35,26 @@ Advanced Downloader for M3U8, DASH, and Direct Files
 HEADERS = {'User-Agent': 'Mozilla/5.0'}
 MAX_RETRIES = 5
 RETRY_BACKOFF = 2  # seconds
+RETRY_MAX_DELAY = 30  # seconds
+WRITE_BUFFER = 1 << 20  # 1 MiB file buffer to coalesce small writes
+PARALLEL_MIN_SIZE = 32 << 20  # split direct files of at least 32 MiB into ranges
+# Ranges are raw byte offsets, so the body must not be content-encoded
+RANGE_HEADERS = {'Accept-Encoding': 'identity'}
+
+# Fully qualified DASH tags, compared directly against parsed element tags
+MPD_NS = '{urn:mpeg:dash:schema:mpd:2011}'
+MPD_ADAPTATION_SET = MPD_NS + 'AdaptationSet'
+MPD_REPRESENTATION = MPD_NS + 'Representation'
+MPD_SEGMENT_TEMPLATE = MPD_NS + 'SegmentTemplate'
+
+# Independently seeded so parallel workers don't retry in lockstep
+_RNG = random.Random(os.urandom(8))
+
+# Shared session so segment downloads reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+SESSION.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
 
 def get_filename_from_url(url):
     path = urlparse(url).path
@@ -44,150 +63,417 @@ def get_filename_from_url(url):
         filename = filename.rsplit('.', 1)[0]
     return unquote(filename) or "output"
 
-def ensure_unique_filename(directory, filename, extension):
+def ensure_unique_filename(directory, filename, extension, reserved=()):
+    # List the directory once instead of probing each candidate on disk.
+    # Names are casefolded so case-insensitive filesystems (macOS, Windows)
+    # can't alias an existing file; elsewhere this only skips a free name.
+    try:
+        with os.scandir(directory) as entries:
+            taken = {entry.name.casefold() for entry in entries}
+    except FileNotFoundError:
+        taken = set()
+    # Paths already handed out but not written yet
+    taken.update(os.path.basename(path).casefold() for path in reserved)
+
     base_name = filename
     counter = 1
-    candidate = os.path.join(directory, filename + extension)
-    while os.path.exists(candidate):
-        candidate = os.path.join(directory, f"{base_name}_{counter}{extension}")
+    candidate = filename + extension
+    while candidate.casefold() in taken:
+        candidate = f"{base_name}_{counter}{extension}"
         counter += 1
-    return candidate
+    return os.path.join(directory, candidate)
+
+class _ProgressWriter:
+    """
+    File wrapper that advances a progress bar on every write. Loops until all
+    of b is written, since unbuffered (raw) files may write only part of it.
+    """
+    def __init__(self, f, pbar):
+        self.f = f
+        self.pbar = pbar
+
+    def write(self, b):
+        view = memoryview(b)
+        while view:
+            n = self.f.write(view)
+            self.pbar.update(n)
+            view = view[n:]
+        return len(b)
+
+def copy_response(r, f, pbar):
+    """
+    Stream a response body into f in C-level 1 MiB reads.
+    """
+    r.raw.decode_content = True
+    shutil.copyfileobj(r.raw, _ProgressWriter(f, pbar), length=WRITE_BUFFER)
+
+def retry_delay(attempt, error=None):
+    """
+    Seconds to wait before retrying: the server's Retry-After on 429/503,
+    otherwise exponential backoff with full jitter. Both are capped at
+    RETRY_MAX_DELAY so a single worker never stalls the whole download.
+    """
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code in (429, 503):
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), RETRY_MAX_DELAY)
+        try:
+            delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            return min(max(0, delay), RETRY_MAX_DELAY)
+        except (TypeError, ValueError):
+            pass
+    return _RNG.uniform(0, min(RETRY_MAX_DELAY, RETRY_BACKOFF * 2 ** (attempt - 1)))
 
 def retry_request(url, stream=False):
     for attempt in range(1, MAX_RETRIES + 1):
         try:
-            r = requests.get(url, headers=HEADERS, stream=stream, timeout=15)
+            r = SESSION.get(url, stream=stream, timeout=15)
             r.raise_for_status()
             return r
         except Exception as e:
             print(f"[!] Attempt {attempt} failed for {url}: {e}")
             if attempt == MAX_RETRIES:
                 raise
-            time.sleep(RETRY_BACKOFF ** attempt)
+            time.sleep(retry_delay(attempt, e))
 
-def download_file(url, directory, filename, resume=True):
-    os.makedirs(directory, exist_ok=True)
+def guess_extension(content_type):
+    """
+    Guess a file extension for common video types from a Content-Type header.
+    """
+    if 'video' in content_type:
+        if 'mp4' in content_type: return '.mp4'
+        elif 'mpeg' in content_type: return '.mpeg'
+        elif 'ts' in content_type: return '.ts'
+        elif 'webm' in content_type: return '.webm'
+        elif 'ogg' in content_type: return '.ogg'
+    return '.bin'
+
+def preallocate(f, offset, length):
+    """
+    Reserve length bytes at offset in one call. Where os.posix_fallocate exists
+    (Linux) the blocks are really allocated, so a full disk fails up front;
+    elsewhere the file is only extended to its final size.
+    """
+    if length <= 0:
+        return
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), offset, length)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise
+    else:
+        # Windows extends via SetEndOfFile; on macOS this only makes a sparse
+        # file, so nothing is allocated and a full disk still fails mid-write
+        pos = f.tell()
+        f.truncate(offset + length)
+        f.seek(pos)
 
-    # Determine extension & full path
-    head = requests.head(url, headers=HEADERS)
-    content_type = head.headers.get('Content-Type', '')
-    ext = os.path.splitext(urlparse(url).path)[1] or ''
+class RangesUnsupported(RuntimeError):
+    """
+    The server answered a Range request with the whole body.
+    """
 
-    # Guess extension for common video types if missing
-    if not ext and 'video' in content_type:
-        if 'mp4' in content_type: ext = '.mp4'
-        elif 'mpeg' in content_type: ext = '.mpeg'
-        elif 'ts' in content_type: ext = '.ts'
-        elif 'webm' in content_type: ext = '.webm'
-        elif 'ogg' in content_type: ext = '.ogg'
-    if not ext:
-        ext = '.bin'
+def supports_ranges(url):
+    """
+    Probe the first byte of url to check that Range requests get a 206.
+    """
+    try:
+        with SESSION.get(url, headers={**RANGE_HEADERS, 'Range': 'bytes=0-0'}, stream=True, timeout=15) as r:
+            return r.status_code == 206
+    except requests.RequestException:
+        return False
 
-    full_path = ensure_unique_filename(directory, filename, ext)
-    mode = 'ab' if resume and os.path.exists(full_path) else 'wb'
-    downloaded = os.path.getsize(full_path) if mode == 'ab' else 0
+def download_range(url, fd, start, end, pbar, cancel, retries=MAX_RETRIES):
+    """
+    Download bytes start-end of url into fd at the same offset, resuming from
+    the last written byte on retry. Stops early once cancel is set.
+    """
+    pos = start
+    for attempt in range(1, retries+1):
+        if cancel.is_set():
+            return
+        try:
+            headers = {**RANGE_HEADERS, 'Range': f'bytes={pos}-{end}'}
+            with SESSION.get(url, headers=headers, stream=True, timeout=15) as r:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise RangesUnsupported(f"server answered {r.status_code} to a Range request")
+                for chunk in r.iter_content(chunk_size=WRITE_BUFFER):
+                    if cancel.is_set():
+                        return
+                    # pwrite may write only part of the chunk
+                    view = memoryview(chunk)
+                    while view:
+                        n = os.pwrite(fd, view, pos)
+                        pos += n
+                        pbar.update(n)
+                        view = view[n:]
+            if pos > end:
+                return
+            raise RuntimeError(f"connection closed at byte {pos}")
+        except RangesUnsupported:
+            raise
+        except Exception as e:
+            print(f"[!] Range {start}-{end} download attempt {attempt} failed: {e}")
+            if attempt == retries:
+                raise
+            cancel.wait(retry_delay(attempt, e))
 
-    headers = HEADERS.copy()
-    if mode == 'ab':
-        headers['Range'] = f'bytes={downloaded}-'
+def download_ranges(url, full_path, total_size, parallel):
+    """
+    Download a file over parallel Range requests, each writing its own region
+    of the preallocated output file. The first failure cancels the other ranges.
+    """
+    part = -(-total_size // parallel)
+    ranges = [(start, min(start + part, total_size) - 1) for start in range(0, total_size, part)]
 
-    total_size = int(head.headers.get('Content-Length', 0)) + downloaded if 'Content-Length' in head.headers else None
+    print(f"[+] Server supports ranges, downloading in {len(ranges)} parts")
 
-    print(f"[+] Downloading file: {url}")
+    cancel = threading.Event()
+    try:
+        with open(full_path, 'wb') as f, \
+             tqdm(
+                total=total_size,
+                unit='B', unit_scale=True, unit_divisor=1024,
+                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]",
+                colour='cyan'
+             ) as pbar:
+
+            preallocate(f, 0, total_size)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=parallel)
+            futures = []
+            try:
+                futures = [
+                    executor.submit(download_range, url, f.fileno(), start, end, pbar, cancel)
+                    for start, end in ranges
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                # Drop queued ranges and stop running ones after their current chunk
+                cancel.set()
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                # Running workers still hold f's descriptor, so let them return first
+                executor.shutdown(wait=True)
+    except BaseException:
+        # A full-size file with unwritten gaps would look like a finished download
+        os.remove(full_path)
+        raise
+
+def download_file(url, directory, filename, resume=True, parallel=1):
+    os.makedirs(directory, exist_ok=True)
+
+    # Resolve the path up front when the URL already carries an extension
+    ext = os.path.splitext(urlparse(url).path)[1] or ''
+    full_path = ensure_unique_filename(directory, filename, ext) if ext else None
+    # Resume writes in place (not append) so the file can be preallocated
+    mode = 'wb'
+    downloaded = 0
+    if resume and full_path:
+        try:
+            downloaded = os.stat(full_path).st_size
+            mode = 'r+b'
+        except FileNotFoundError:
+            pass
 
-    with requests.get(url, headers=headers, stream=True) as r, \
-         open(full_path, mode) as f, \
-         tqdm(
-            total=total_size, initial=downloaded,
-            unit='B', unit_scale=True, unit_divisor=1024,
-            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]",
-            colour='cyan'
-         ) as pbar:
+    # Session headers apply by default; only a resume needs per-request headers
+    headers = {'Range': f'bytes={downloaded}-'} if mode == 'r+b' else None
 
-        for chunk in r.iter_content(chunk_size=1024):
-            if chunk:
-                f.write(chunk)
-                pbar.update(len(chunk))
+    print(f"[+] Downloading file: {url}")
+
+    with SESSION.get(url, headers=headers, stream=True) as r:
+        # Otherwise name the file from the GET response headers
+        if not ext:
+            ext = guess_extension(r.headers.get('Content-Type', ''))
+            full_path = ensure_unique_filename(directory, filename, ext)
+
+        total_size = int(r.headers.get('Content-Length', 0)) + downloaded if 'Content-Length' in r.headers else None
+
+        # Large fresh downloads from range-capable servers are split across connections
+        if (parallel > 1 and mode == 'wb' and hasattr(os, 'pwrite')
+                and r.status_code == 200 and r.headers.get('Accept-Ranges') == 'bytes'
+                and 'Content-Encoding' not in r.headers
+                and total_size and total_size >= PARALLEL_MIN_SIZE):
+            # Keep this response for the single-stream path unless a range probe succeeds
+            if supports_ranges(url):
+                r.close()
+                try:
+                    download_ranges(url, full_path, total_size, parallel)
+                except RangesUnsupported as e:
+                    print(f"[!] {e}, falling back to a single stream")
+                    return download_file(url, directory, filename, resume, parallel=1)
+                print(f"[✔] Saved file as: {full_path}")
+                return full_path
+
+        with open(full_path, mode, buffering=WRITE_BUFFER) as f, \
+             tqdm(
+                total=total_size, initial=downloaded,
+                unit='B', unit_scale=True, unit_divisor=1024,
+                bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}]",
+                colour='cyan'
+             ) as pbar:
+
+            f.seek(downloaded)
+            if total_size:
+                preallocate(f, downloaded, total_size - downloaded)
+            try:
+                copy_response(r, f, pbar)
+            finally:
+                # Drop any preallocated tail that was never written
+                f.truncate(f.tell())
 
     print(f"[✔] Saved file as: {full_path}")
     return full_path
 
-def download_segment(url, directory, idx, total, retries=MAX_RETRIES):
+def download_segment(url, directory, idx, total, retries=MAX_RETRIES, session=SESSION):
     """
     Download a single segment with retry and resume support.
     """
     local_filename = os.path.join(directory, f"segment_{idx}.ts")
     temp_filename = local_filename + ".part"
 
-    downloaded = os.path.getsize(temp_filename) if os.path.exists(temp_filename) else 0
-    headers = HEADERS.copy()
-    if downloaded > 0:
-        headers['Range'] = f'bytes={downloaded}-'
+    try:
+        downloaded = os.stat(temp_filename).st_size
+    except FileNotFoundError:
+        downloaded = 0
+    headers = {'Range': f'bytes={downloaded}-'} if downloaded > 0 else None
 
     for attempt in range(1, retries+1):
         try:
-            with requests.get(url, headers=headers, stream=True, timeout=15) as r:
+            with session.get(url, headers=headers, stream=True, timeout=15) as r:
                 r.raise_for_status()
                 total_size = int(r.headers.get('Content-Length', 0)) + downloaded if 'Content-Length' in r.headers else None
-                with open(temp_filename, 'ab') as f, tqdm(
+                # copy_response already writes 1 MiB blocks, so skip the BufferedWriter
+                with open(temp_filename, 'ab', buffering=0) as f, tqdm(
                     total=total_size, initial=downloaded,
                     unit='B', unit_scale=True, unit_divisor=1024,
-                    desc=f"Segment {idx}/{total}",
+                    desc=f"Segment {idx}/{total}" if total else f"Segment {idx}",
                     leave=False,
                     colour='magenta'
                 ) as pbar:
-                    for chunk in r.iter_content(chunk_size=1024):
-                        if chunk:
-                            f.write(chunk)
-                            pbar.update(len(chunk))
+                    copy_response(r, f, pbar)
             os.rename(temp_filename, local_filename)
             return local_filename
         except Exception as e:
             print(f"[!] Segment {idx} download attempt {attempt} failed: {e}")
-            time.sleep(RETRY_BACKOFF ** attempt)
+            if attempt < retries:
+                time.sleep(retry_delay(attempt, e))
     raise RuntimeError(f"Failed to download segment {idx} after {retries} retries.")
 
-def download_and_merge_segments(playlist, directory, filename, parallel=4):
+class SegmentMerger:
+    """
+    Merge downloaded segments in playlist order while the rest still download.
+    ffmpeg is fed each segment over stdin as soon as all earlier ones are in and
+    remuxes to MP4; with no muxer the segments are appended into a single TS
+    file; mkvmerge needs the full list and appends it into an MKV.
+    """
+    def __init__(self, directory, filename, muxer="ffmpeg"):
+        self.ready = {}
+        self.next_to_pipe = 1
+        self.ordered = []
+        self.proc = None
+        self.sink = None
+
+        if muxer == "mkvmerge":
+            # Fail before downloading anything, as a missing ffmpeg does in Popen
+            if shutil.which("mkvmerge") is None:
+                raise FileNotFoundError("mkvmerge not found in PATH")
+            self.out_file = ensure_unique_filename(directory, filename, ".mkv")
+        elif muxer is None:
+            self.out_file = ensure_unique_filename(directory, filename, ".ts")
+            self.sink = open(self.out_file, 'wb')
+        else:
+            self.out_file = ensure_unique_filename(directory, filename, ".mp4")
+            cmd = [
+                "ffmpeg", "-y", "-i", "pipe:0",
+                "-c", "copy", "-bsf:a", "aac_adtstoasc", self.out_file
+            ]
+            self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                         stderr=subprocess.DEVNULL, bufsize=0)
+            self.sink = self.proc.stdin
+
+    def add(self, idx, seg_file):
+        self.ready[idx] = seg_file
+        while self.next_to_pipe in self.ready:
+            seg_file = self.ready.pop(self.next_to_pipe)
+            if self.sink:
+                with open(seg_file, 'rb') as f:
+                    shutil.copyfileobj(f, self.sink, WRITE_BUFFER)
+                os.remove(seg_file)
+            else:
+                self.ordered.append(seg_file)
+            self.next_to_pipe += 1
+
+    def finish(self):
+        if self.sink:
+            self.sink.close()
+            if self.proc and self.proc.wait() != 0:
+                raise RuntimeError(f"ffmpeg exited with status {self.proc.returncode}")
+        else:
+            cmd = ["mkvmerge", "-o", self.out_file, "[", *self.ordered, "]"]
+            returncode = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            # Segments are only removed after a clean run; 1 means the MKV was
+            # written with warnings, anything higher is an error
+            if returncode == 0:
+                for seg_file in self.ordered:
+                    os.remove(seg_file)
+            elif returncode == 1:
+                print(f"[!] mkvmerge reported warnings, keeping segments in {os.path.dirname(self.out_file) or '.'}")
+            else:
+                raise RuntimeError(f"mkvmerge exited with status {returncode}, segments kept")
+        return self.out_file
+
+    def abort(self):
+        if self.proc:
+            self.proc.kill()
+            self.proc.wait()
+        elif self.sink:
+            self.sink.close()
+
+def download_and_merge_segments(playlist, directory, filename, parallel=4, muxer="ffmpeg"):
     os.makedirs(directory, exist_ok=True)
     segments = playlist.segments
     total = len(segments)
 
     print(f"[+] Starting parallel download of {total} segments with {parallel} workers")
 
-    segment_files = []
+    try:
+        merger = SegmentMerger(directory, filename, muxer)
+    except OSError as e:
+        print(f"[!] Cannot start {muxer}: {e}")
+        sys.exit(1)
     with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
         futures = {
-            executor.submit(download_segment, seg.absolute_uri, directory, i+1, total): i+1
+            executor.submit(download_segment, seg.absolute_uri, directory, i+1, total, session=SESSION): i+1
             for i, seg in enumerate(segments)
         }
         for future in tqdm(concurrent.futures.as_completed(futures), total=total, desc="Segments downloaded", colour='green'):
             idx = futures[future]
             try:
-                segment_file = future.result()
-                segment_files.append(segment_file)
+                seg_file = future.result()
             except Exception as e:
                 print(f"[!] Segment {idx} failed to download: {e}")
+                merger.abort()
+                sys.exit(1)
+            try:
+                merger.add(idx, seg_file)
+            except OSError as e:
+                print(f"[!] Merging segment {merger.next_to_pipe} with {muxer or 'raw TS concatenation'} failed: {e}")
+                merger.abort()
                 sys.exit(1)
 
-    # Merge segments with ffmpeg
-    concat_file = os.path.join(directory, f"{filename}_concat.txt")
-    with open(concat_file, 'w') as f:
-        for seg_file in sorted(segment_files):
-            f.write(f"file '{os.path.abspath(seg_file)}'\n")
-
-    mp4_file = ensure_unique_filename(directory, filename, ".mp4")
-    print("[+] Merging segments into MP4...")
-    cmd = [
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_file,
-        "-c", "copy", mp4_file
-    ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print(f"[✔] Saved merged video as: {mp4_file}")
-
-    # Cleanup segments and concat file
-    for seg_file in segment_files:
-        os.remove(seg_file)
-    os.remove(concat_file)
+    print(f"[+] Finishing merge with {muxer or 'raw TS concatenation'}...")
+    try:
+        out_file = merger.finish()
+    except (OSError, RuntimeError) as e:
+        print(f"[!] Merging segments failed: {e}")
+        sys.exit(1)
+    print(f"[✔] Saved merged video as: {out_file}")
 
 def select_variant_playlist(master_playlist):
     """
@@ -231,136 +517,152 @@ def download_subtitles(playlist, directory):
 
     print(f"[+] Found {len(subtitles)} subtitle track(s). Downloading...")
 
+    # Pick filenames up front so parallel fetches can't claim the same name
+    jobs = []
     for i, sub in enumerate(subtitles, 1):
         uri = sub.uri
         lang = sub.language or f"sub{i}"
-        filename = ensure_unique_filename(directory, f"subtitle_{lang}", os.path.splitext(uri)[1] or ".vtt")
-        try:
-            print(f"  - Downloading subtitle '{lang}' from {uri}")
-            r = retry_request(uri)
-            with open(filename, 'wb') as f:
-                f.write(r.content)
-            print(f"    Saved as {filename}")
-        except Exception as e:
-            print(f"    Failed to download subtitle '{lang}': {e}")
+        filename = ensure_unique_filename(directory, f"subtitle_{lang}", os.path.splitext(uri)[1] or ".vtt",
+                                          reserved=[job[2] for job in jobs])
+        jobs.append((lang, uri, filename))
 
-def is_mpd_url(url):
-    """
-    Simple check for DASH MPD manifest by extension or content-type
-    """
-    if url.lower().endswith('.mpd'):
-        return True
-    try:
-        r = requests.head(url, timeout=5)
-        ctype = r.headers.get('Content-Type', '')
-        if 'application/dash+xml' in ctype:
-            return True
-    except:
-        pass
-    return False
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(jobs))) as executor:
+        futures = [executor.submit(_fetch_one_sub, *job) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
 
-def parse_dash_mpd(url):
+def _fetch_one_sub(lang, uri, filename):
+    try:
+        print(f"  - Downloading subtitle '{lang}' from {uri}")
+        r = retry_request(uri)
+        with open(filename, 'wb') as f:
+            f.write(r.content)
+        print(f"    Saved as {filename}")
+    except Exception as e:
+        print(f"    Failed to download subtitle '{lang}': {e}")
+
+def _iter_dash_segments(url):
     """
-    Parse DASH MPD and extract segment URLs to download sequentially.
+    Stream-parse a DASH MPD and yield segment URLs to download sequentially.
     For simplicity, only supports SegmentTemplate with media URLs.
     """
     print(f"[+] Parsing DASH MPD manifest: {url}")
-    r = requests.get(url, headers=HEADERS)
-    r.raise_for_status()
-
-    root = ET.fromstring(r.content)
-    ns = {'mpd': 'urn:mpeg:dash:schema:mpd:2011'}
 
     # Find base URL
     base_url = url.rsplit('/', 1)[0] + '/'
 
-    # Find Period->AdaptationSet->Representation with SegmentTemplate
-    segments = []
-    for period in root.findall('mpd:Period', ns):
-        for adap_set in period.findall('mpd:AdaptationSet', ns):
-            for rep in adap_set.findall('mpd:Representation', ns):
-                seg_tmpl = rep.find('mpd:SegmentTemplate', ns)
-                if seg_tmpl is not None:
-                    media = seg_tmpl.get('media')
-                    initialization = seg_tmpl.get('initialization')
-                    timescale = int(seg_tmpl.get('timescale', '1'))
-                    start_number = int(seg_tmpl.get('startNumber', '1'))
-                    duration = int(seg_tmpl.get('duration', '0'))
-
-                    # Download initialization segment
-                    if initialization:
-                        init_url = urljoin(base_url, initialization.replace('$RepresentationID$', rep.get('id')))
-                        segments.append(init_url)
-
-                    # Calculate total segments count roughly (for demo assume 10)
-                    count = 10
-
-                    # Download media segments
-                    for i in range(start_number, start_number + count):
-                        media_url = media.replace('$RepresentationID$', rep.get('id')).replace('$Number$', str(i))
-                        segments.append(urljoin(base_url, media_url))
-                    break
-
-    return segments
-
-def download_dash(url, directory, filename):
+    with SESSION.get(url, stream=True) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+
+        # Take the first Representation with a SegmentTemplate per AdaptationSet
+        picked = False
+        for event, elem in ET.iterparse(r.raw, events=('start', 'end')):
+            if elem.tag == MPD_ADAPTATION_SET:
+                picked = False
+                if event == 'end':
+                    elem.clear()
+                continue
+            if event != 'end' or elem.tag != MPD_REPRESENTATION:
+                continue
+
+            seg_tmpl = elem.find(MPD_SEGMENT_TEMPLATE)
+            if seg_tmpl is not None and not picked:
+                picked = True
+                media = seg_tmpl.get('media')
+                initialization = seg_tmpl.get('initialization')
+                timescale = int(seg_tmpl.get('timescale', '1'))
+                start_number = int(seg_tmpl.get('startNumber', '1'))
+                duration = int(seg_tmpl.get('duration', '0'))
+
+                # Download initialization segment
+                if initialization:
+                    yield urljoin(base_url, initialization.replace('$RepresentationID$', elem.get('id')))
+
+                # Calculate total segments count roughly (for demo assume 10)
+                count = 10
+
+                # Resolve the media template once into a format string for $Number$
+                media_tmpl = urljoin(base_url, media.replace('$RepresentationID$', elem.get('id')))
+                media_tmpl = media_tmpl.replace('{', '{{').replace('}', '}}').replace('$Number$', '{n}')
+
+                # Download media segments
+                for i in range(start_number, start_number + count):
+                    yield media_tmpl.format(n=i)
+            elem.clear()
+
+def download_dash(url, directory, filename, parallel=4, muxer="ffmpeg"):
     os.makedirs(directory, exist_ok=True)
-    segments = parse_dash_mpd(url)
-    total = len(segments)
 
-    print(f"[+] Downloading {total} DASH segments")
+    print(f"[+] Downloading DASH segments with {parallel} workers")
 
-    segment_files = []
+    try:
+        merger = SegmentMerger(directory, filename, muxer)
+    except OSError as e:
+        print(f"[!] Cannot start {muxer}: {e}")
+        sys.exit(1)
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+    with concurrent.futures.ThreadPoolExecutor(max_workers=parallel) as executor:
+        # Submit segments as the manifest is parsed; the total is only known afterwards
         futures = {
-            executor.submit(download_segment, seg_url, directory, idx + 1, total): idx + 1
-            for idx, seg_url in enumerate(segments)
+            executor.submit(download_segment, seg_url, directory, idx + 1, None, session=SESSION): idx + 1
+            for idx, seg_url in enumerate(_iter_dash_segments(url))
         }
+        total = len(futures)
         for future in tqdm(concurrent.futures.as_completed(futures), total=total, desc="DASH segments", colour='blue'):
             idx = futures[future]
             try:
-                segment_file = future.result()
-                segment_files.append(segment_file)
+                seg_file = future.result()
             except Exception as e:
                 print(f"[!] DASH segment {idx} failed: {e}")
+                merger.abort()
+                sys.exit(1)
+            try:
+                merger.add(idx, seg_file)
+            except OSError as e:
+                print(f"[!] Merging DASH segment {merger.next_to_pipe} with {muxer} failed: {e}")
+                merger.abort()
                 sys.exit(1)
 
     # Merge DASH segments (assuming ts segments)
-    concat_file = os.path.join(directory, f"{filename}_concat.txt")
-    with open(concat_file, 'w') as f:
-        for seg_file in sorted(segment_files):
-            f.write(f"file '{os.path.abspath(seg_file)}'\n")
-
-    mp4_file = ensure_unique_filename(directory, filename, ".mp4")
-    print("[+] Merging DASH segments into MP4...")
-    cmd = [
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_file,
-        "-c", "copy", mp4_file
-    ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    print(f"[✔] Saved merged DASH video as: {mp4_file}")
-
-    # Cleanup
-    for seg_file in segment_files:
-        os.remove(seg_file)
-    os.remove(concat_file)
-
-
-def is_m3u8_url(url):
-    """Quick check if URL points to m3u8 playlist by checking extension or content."""
-    # Check extension first
-    if url.lower().endswith('.m3u8'):
-        return True
-    # If extension unknown, try to check content-type header
+    print(f"[+] Finishing DASH merge with {muxer}...")
     try:
-        r = requests.head(url, timeout=5)
-        content_type = r.headers.get('Content-Type', '')
-        if 'application/vnd.apple.mpegurl' in content_type or 'application/x-mpegURL' in content_type:
-            return True
-    except:
-        pass
-    return False
+        out_file = merger.finish()
+    except (OSError, RuntimeError) as e:
+        print(f"[!] Merging DASH segments failed: {e}")
+        sys.exit(1)
+    print(f"[✔] Saved merged DASH video as: {out_file}")
+
+
+_URL_KINDS = {}
+
+def classify_url(url):
+    """
+    Classify URL as 'mpd', 'm3u8' or 'file' by extension, falling back to a
+    single cached HEAD request for the content-type.
+    """
+    if url in _URL_KINDS:
+        return _URL_KINDS[url]
+
+    path = urlparse(url).path.lower()
+    if path.endswith('.mpd'):
+        kind = 'mpd'
+    elif path.endswith('.m3u8'):
+        kind = 'm3u8'
+    else:
+        kind = 'file'
+        try:
+            r = SESSION.head(url, timeout=5, allow_redirects=True)
+            ctype = r.headers.get('Content-Type', '').lower()
+            if 'application/dash+xml' in ctype:
+                kind = 'mpd'
+            elif 'application/vnd.apple.mpegurl' in ctype or 'application/x-mpegurl' in ctype:
+                kind = 'm3u8'
+        except requests.RequestException:
+            pass
+
+    _URL_KINDS[url] = kind
+    return kind
 
 def main():
     print(AXM_BANNER)
@@ -371,24 +673,32 @@ def main():
     parser.add_argument("--url", required=True, help="The media URL to download (M3U8, DASH MPD, or direct file).")
     parser.add_argument("--name", default=None, help="Optional output filename (without extension).")
     parser.add_argument("--dir", default="downloads", help="Directory to save downloads (default: downloads).")
-    parser.add_argument("--parallel", type=int, default=4, help="Number of parallel downloads for segments (default: 4).")
+    parser.add_argument("--parallel", type=int, default=4, help="Number of parallel downloads for segments or large file ranges (default: 4).")
+    mux_group = parser.add_mutually_exclusive_group()
+    mux_group.add_argument("--muxer", choices=["ffmpeg", "mkvmerge"], default="ffmpeg", help="Tool used to merge segments: ffmpeg writes MP4, mkvmerge writes MKV (default: ffmpeg).")
+    mux_group.add_argument("--no-mux", action="store_true", help="Concatenate HLS segments into a single .ts file without running a muxer.")
 
     args = parser.parse_args()
+    muxer = None if args.no_mux else args.muxer
 
-    if is_mpd_url(args.url):
+    kind = classify_url(args.url)
+    if kind == 'mpd':
+        # DASH segments are usually fragmented MP4, not TS
+        if args.no_mux:
+            parser.error("--no-mux only applies to HLS (M3U8) downloads")
         filename = args.name if args.name else get_filename_from_url(args.url)
-        download_dash(args.url, args.dir, filename)
-    elif is_m3u8_url(args.url):
+        download_dash(args.url, args.dir, filename, parallel=args.parallel, muxer=muxer)
+    elif kind == 'm3u8':
         playlist = m3u8.load(args.url)
         if playlist.is_variant:
             playlist = select_variant_playlist(playlist)
         filename = args.name if args.name else get_filename_from_url(args.url)
 
         download_subtitles(playlist, args.dir)
-        download_and_merge_segments(playlist, args.dir, filename, parallel=args.parallel)
+        download_and_merge_segments(playlist, args.dir, filename, parallel=args.parallel, muxer=muxer)
     else:
         filename = args.name if args.name else get_filename_from_url(args.url)
-        download_file(args.url, args.dir, filename)
+        download_file(args.url, args.dir, filename, parallel=args.parallel)
 
 
 if __name__ == "__main__":